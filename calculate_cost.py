@@ -2,13 +2,25 @@ from terrafin_calculator.calculator import CostCalculator
 import sys
 import logging
 
-def create_box(width, title=""):
-    border = "+" + "-" * (width - 2) + "+"
+# Report layout
+WIDTH = 120
+RESOURCE_COL = 60
+TYPE_COL = 25
+COST_COL = 15
+DETAILS_COL = WIDTH - RESOURCE_COL - TYPE_COL - COST_COL - 7  # 7 for separators
+
+BORDER = "+" + "-" * (WIDTH - 2) + "+"
+SEPARATOR = f"+{'-'*RESOURCE_COL}+{'-'*TYPE_COL}+{'-'*COST_COL}+{'-'*DETAILS_COL}+"
+ROW_TEMPLATE = f"| {{name:<{RESOURCE_COL}}} | {{type:<{TYPE_COL}}} | {{cost:<{COST_COL}}} | {{details:<{DETAILS_COL}}} |"
+HEADER = ROW_TEMPLATE.format(name="Resource", type="Type", cost="Monthly Cost", details="Details")
+
+def centered(text):
+    return f"| {text.center(WIDTH - 4)} |"
+
+def create_box(title=""):
     if title:
-        padding = (width - len(title) - 4) // 2
-        title_line = "| " + " " * padding + title + " " * (width - len(title) - padding - 4) + " |"
-        return [border, title_line, border]
-    return [border]
+        return [BORDER, centered(title), BORDER]
+    return [BORDER]
 
 def main():
     # Disable INFO logging
@@ -24,31 +36,31 @@ def main():
         # Initialize calculator with the plan file path
         calculator = CostCalculator(plan_file)
         
-        # Calculate costs
-        breakdown = calculator.calculate_costs()
-        
-        # Set up formatting
-        width = 120  # Back to wider format
-        resource_col = 60  # Back to wider column
-        type_col = 25
-        cost_col = 15
-        details_col = width - resource_col - type_col - cost_col - 7  # 7 for separators
+        # Calculate costs, then release the pricing client
+        try:
+            breakdown = calculator.calculate_costs()
+        finally:
+            calculator.close()
         
-        # Create the report
-        report = []
-        report.append("")  # Start with a blank line
+        # Stream the report to stdout as it is generated
+        write = sys.stdout.write
+
+        def emit(*lines):
+            for line in lines:
+                write(line)
+                write("\n")
+
+        emit("")  # Start with a blank line
         
         # Header box
-        report.extend(create_box(width, "Azure Resource Cost Estimation"))
-        report.append("")
+        emit(*create_box("Azure Resource Cost Estimation"))
+        emit("")
         
         # Resources box
-        report.extend(create_box(width, "Resource Costs"))
+        emit(*create_box("Resource Costs"))
         
         # Column headers
-        header = f"| {'Resource':<{resource_col}} | {'Type':<{type_col}} | {'Monthly Cost':<{cost_col}} | {'Details':<{details_col}} |"
-        separator = f"+{'-'*resource_col}+{'-'*type_col}+{'-'*cost_col}+{'-'*details_col}+"
-        report.extend([header, separator])
+        emit(HEADER, SEPARATOR)
         
         # Resource rows
         for resource in breakdown.resources:
@@ -58,35 +70,29 @@ def main():
             # Truncate long values with ellipsis if needed
             resource_name = resource.address
             type_name = resource.type
-            if len(resource_name) > resource_col:
-                resource_name = resource_name[:resource_col-3] + "..."
-            if len(type_name) > type_col:
-                type_name = type_name[:type_col-3] + "..."
-            if len(details) > details_col:
-                details = details[:details_col-3] + "..."
+            if len(resource_name) > RESOURCE_COL:
+                resource_name = resource_name[:RESOURCE_COL-3] + "..."
+            if len(type_name) > TYPE_COL:
+                type_name = type_name[:TYPE_COL-3] + "..."
+            if len(details) > DETAILS_COL:
+                details = details[:DETAILS_COL-3] + "..."
             
-            row = f"| {resource_name:<{resource_col}} | {type_name:<{type_col}} | {cost_str:<{cost_col}} | {details:<{details_col}} |"
-            report.append(row)
+            emit(ROW_TEMPLATE.format(
+                name=resource_name, type=type_name, cost=cost_str, details=details
+            ))
         
         # Close resources box
-        report.append(separator)
-        report.append("")
+        emit(SEPARATOR, "")
         
         # Summary box
-        report.extend(create_box(width, "Summary"))
-        total_line = f"Total Estimated Monthly Cost: ${breakdown.total_monthly_cost:.2f}"
-        padding = (width - len(total_line) - 4) // 2
-        report.append(f"| {' ' * padding}{total_line}{' ' * (width - len(total_line) - padding - 4)} |")
+        emit(*create_box("Summary"))
+        emit(centered(f"Total Estimated Monthly Cost: ${breakdown.total_monthly_cost:.2f}"))
         
         # Threshold status
         status = "Cost is within threshold!" if calculator.validate_cost_threshold(breakdown) else "Warning: Cost exceeds threshold!"
-        padding = (width - len(status) - 4) // 2
-        report.append(f"| {' ' * padding}{status}{' ' * (width - len(status) - padding - 4)} |")
-        report.extend(create_box(width))
-        report.append("")  # End with a blank line
-        
-        # Print the report
-        print("\n".join(report))
+        emit(centered(status))
+        emit(*create_box())
+        emit("")  # End with a blank line
             
     except Exception as e:
         print(f"Error calculating costs: {str(e)}")
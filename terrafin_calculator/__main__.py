@@ -11,9 +11,38 @@ import os
 import sys
 from typing import Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .calculator import CostCalculator
 
+SLACK_TITLE = "Terraform Cost Estimation Report"
+SLACK_TIMEOUT = 10  # Seconds
+
+# Header block shared by every Slack notification
+_SLACK_HEADER_BLOCK = {
+    "type": "header",
+    "text": {
+        "type": "plain_text",
+        "text": SLACK_TITLE
+    }
+}
+
+# Reused across notifications so repeated sends share a connection. Only
+# throttled and connection failures are retried, since retrying a POST whose
+# response was lost could post the report twice.
+_SLACK_SESSION = requests.Session()
+_SLACK_SESSION.mount('https://', HTTPAdapter(max_retries=Retry(
+    total=3,
+    read=0,
+    backoff_factor=0.5,
+    backoff_jitter=0.5,
+    status_forcelist=[429],
+    allowed_methods=['POST'],
+    respect_retry_after_header=True
+)))
+
+
 def setup_logging(debug: bool = False) -> None:
     """Configure logging settings.
 
@@ -38,15 +67,9 @@ def send_slack_notification(webhook_url: str, report: str) -> None:
         requests.RequestException: If the Slack API request fails.
     """
     payload = {
-        "text": "Terraform Cost Estimation Report",
+        "text": SLACK_TITLE,
         "blocks": [
-            {
-                "type": "header",
-                "text": {
-                    "type": "plain_text",
-                    "text": "Terraform Cost Estimation Report"
-                }
-            },
+            _SLACK_HEADER_BLOCK,
             {
                 "type": "section",
                 "text": {
@@ -57,7 +80,7 @@ def send_slack_notification(webhook_url: str, report: str) -> None:
         ]
     }
 
-    response = requests.post(webhook_url, json=payload)
+    response = _SLACK_SESSION.post(webhook_url, json=payload, timeout=SLACK_TIMEOUT)
     response.raise_for_status()
     logging.info("Cost report sent to Slack successfully")
 
@@ -101,6 +124,12 @@ def main() -> int:
         help="Write report to file instead of stdout"
     )
 
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached prices and fetch them from the API again"
+    )
+
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -120,12 +149,15 @@ def main() -> int:
 
     try:
         # Initialize calculator and set threshold if provided
-        calculator = CostCalculator(args.plan_file)
+        calculator = CostCalculator(args.plan_file, refresh_cache=args.refresh_cache)
         if args.cost_threshold:
             calculator.set_cost_threshold(args.cost_threshold)
 
-        # Calculate costs
-        cost_breakdown = calculator.calculate_costs()
+        # Calculate costs, then release the pricing client
+        try:
+            cost_breakdown = calculator.calculate_costs()
+        finally:
+            calculator.close()
         
         # Format report
         report = calculator.format_cost_report(cost_breakdown, args.output_format)
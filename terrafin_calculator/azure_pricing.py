@@ -5,19 +5,138 @@ This module handles interactions with the Azure Retail Pricing API to fetch
 current pricing information for Azure resources.
 """
 
+import os
+import math
 import time
+import bisect
+import json
+import sqlite3
+import functools
+import inspect
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from typing import Dict, List, Optional, Any, Tuple
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
+
+def default_cache_file() -> str:
+    """Get the path of the on-disk pricing cache.
+
+    The directory can be overridden with the ``TERRAFIN_CACHE_DIR``
+    environment variable.
+    """
+    cache_dir = os.getenv('TERRAFIN_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'terrafin'
+    )
+    return os.path.join(cache_dir, 'prices.sqlite')
+
+
+def _normalize(value: str) -> str:
+    """Canonicalize a filter value so equivalent lookups share a cache key."""
+    return value.strip().lower()
+
+
+@functools.lru_cache(maxsize=4096)
+def _build_filter(service: Optional[str],
+                  region: Optional[str],
+                  sku: Optional[str] = None,
+                  tier: Optional[str] = None) -> Tuple[str, str]:
+    """Build the cache key and OData filter string for a price lookup.
+
+    Arguments left as None are omitted from both. The cache key uses
+    normalized values, so lookups differing only in case or surrounding
+    whitespace share an entry. The filter keeps the original casing since
+    the API matches some fields case-sensitively.
+
+    Returns:
+        Tuple of (cache_key, filter_string).
+    """
+    cache_key = "|".join(
+        f"{k}={_normalize(v)}" for k, v in (
+            ('armRegionName', region),
+            ('serviceName', service),
+            ('skuName', sku),
+            ('tierName', tier),
+        )
+        if v is not None
+    )
+
+    service, region, sku, tier = (
+        v.strip() if v is not None else None
+        for v in (service, region, sku, tier)
+    )
+    filter_parts = []
+    if service is not None:
+        filter_parts.append(f"serviceName eq '{service}'")
+    if region is not None:
+        filter_parts.append(f"armRegionName eq '{region.lower()}'")
+    if sku is not None:
+        filter_parts.append(f"contains(skuName, '{sku}')")
+    if tier is not None:
+        filter_parts.append(f"contains(productName, '{tier}')")
+
+    return cache_key, " and ".join(filter_parts)
+
+
+def _spec_filter(spec: Dict[str, str]) -> Tuple[str, str]:
+    """Build the cache key and OData filter string for a filter dictionary."""
+    return _build_filter(
+        spec.get('serviceName'),
+        spec.get('armRegionName'),
+        spec.get('skuName'),
+        spec.get('tierName')
+    )
+
+
+def _memoize_lookup(method):
+    """Memoize a price lookup on the client it's called on.
+
+    Plans often repeat the same SKU and location many times. Entries expire
+    with ``CACHE_DURATION`` and are dropped by ``clear_cache()``. Misses are
+    not memoized, so a failed lookup is retried next time.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Bind so positional and keyword calls share a key
+        bound = signature.bind(self, *args, **kwargs)
+        key = (method.__name__,) + bound.args[1:]
+        with self._lock:
+            entry = self._lookups.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+        price_data = method(self, *args, **kwargs)
+        if price_data is not None:
+            expiry = time.monotonic() + self.CACHE_DURATION.total_seconds()
+            with self._lock:
+                self._lookups[key] = (expiry, price_data)
+        return price_data
+
+    return wrapper
+
+
 class AzurePricingClient:
-    """Client for the Azure Retail Pricing API."""
+    """Client for the Azure Retail Pricing API.
+
+    A single client should be shared by all handlers so lookups reuse its
+    pooled keep-alive connections and caches. Use it as a context manager,
+    or call ``close()``, to release the disk cache connection and the session.
+    """
 
     BASE_URL = "https://prices.azure.com/api/retail/prices"
-    CACHE_DURATION = timedelta(hours=1)  # Cache prices for 1 hour
+    CACHE_DURATION = timedelta(hours=24)  # Retail prices change on the order of days
+    PREFETCH_BATCH_SIZE = 20  # Specs per batched query, keeps URLs short
+    PREFETCH_MAX_PAGES = 5  # Result pages read per batch before giving up
+    MISS_CACHE_DURATION = timedelta(minutes=5)  # Prices a full batch didn't return
+    POOL_CONNECTIONS = 16  # Connection pools kept per session
+    POOL_MAXSIZE = 16  # Keep-alive connections per pool, one per concurrent lookup
 
     # Standard pricing tiers for common resources
     VM_PRICING = {
@@ -33,6 +152,16 @@ class AzurePricingClient:
         'Premium_ZRS': 0.175,      # $0.175 per GB/month
     }
 
+    # Disk tiers by maximum size in GB, sorted by size
+    DISK_TIERS = [
+        (32, 'P4'),
+        (64, 'P6'),
+        (128, 'P10'),
+        (256, 'P15'),
+        (math.inf, 'P20'),
+    ]
+    _DISK_TIER_SIZES = [max_size for max_size, _ in DISK_TIERS]
+
     DISK_PRICING = {
         'Standard_LRS': {
             'P4': 5.28,      # $5.28 per month (32 GB)
@@ -50,15 +179,55 @@ class AzurePricingClient:
         }
     }
 
-    def __init__(self):
-        """Initialize the Azure Pricing API client."""
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._cache_timestamps: Dict[str, datetime] = {}
+    def __init__(self, cache_file: Optional[str] = None, refresh_cache: bool = False):
+        """Initialize the Azure Pricing API client.
+
+        Args:
+            cache_file: Path of the on-disk pricing cache shared across runs.
+                Defaults to ``default_cache_file()``.
+            refresh_cache: Ignore prices cached by previous runs and fetch
+                them again, overwriting the stale entries.
+        """
+        # Maps cache key to (monotonic expiry time, price data)
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # Maps price lookup arguments to (monotonic expiry time, price data)
+        self._lookups: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+        # Maps cache key to monotonic expiry time, for prices known to be missing
+        self._misses: Dict[str, float] = {}
+        self._refresh_cache = refresh_cache
+        self._store = self._open_store(cache_file or default_cache_file())
+        # Guards the caches when handlers run on multiple threads
+        self._lock = threading.Lock()
         self._session = requests.Session()
 
+        # Retry throttled and transient failures with jittered exponential
+        # backoff, honoring Retry-After on 429 responses
+        retry = Retry(
+            total=5,
+            backoff_factor=0.5,
+            backoff_jitter=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_CONNECTIONS,
+            pool_maxsize=self.POOL_MAXSIZE,
+            max_retries=retry
+        )
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def __enter__(self) -> 'AzurePricingClient':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @_memoize_lookup
     def get_vm_price(self, size: str, region: str) -> Optional[Dict[str, Any]]:
         """Get pricing for a specific VM size."""
-        logger.info(f"Getting VM price for size={size}, region={region}")
+        logger.info("Getting VM price for size=%s, region=%s", size, region)
         
         # Use standard pricing for common VM sizes
         hourly_rate = self.VM_PRICING.get(size)
@@ -72,22 +241,19 @@ class AzurePricingClient:
 
         # If not in standard pricing, try API
         try:
-            price_data = self._fetch_price(
-                serviceName='Virtual Machines',
-                armRegionName=region,
-                skuName=size
-            )
+            price_data = self._fetch_price(**self.vm_price_spec(size, region))
             if price_data:
                 return price_data
         except Exception as e:
-            logger.warning(f"API request failed for VM pricing: {str(e)}")
+            logger.warning("API request failed for VM pricing: %s", e)
 
-        logger.warning(f"Could not find pricing for VM size: {size}")
+        logger.warning("Could not find pricing for VM size: %s", size)
         return None
 
+    @_memoize_lookup
     def get_storage_price(self, account_type: str, region: str) -> Optional[Dict[str, Any]]:
         """Get pricing for a storage account type."""
-        logger.info(f"Getting storage price for type={account_type}, region={region}")
+        logger.info("Getting storage price for type=%s, region=%s", account_type, region)
 
         # Use standard pricing for common storage types
         price_per_gb = self.STORAGE_PRICING.get(account_type)
@@ -102,39 +268,28 @@ class AzurePricingClient:
         # If not in standard pricing, try API
         try:
             price_data = self._fetch_price(
-                serviceName='Storage',
-                armRegionName=region,
-                skuName=account_type
+                **self.storage_price_spec(account_type, region)
             )
             if price_data:
                 return price_data
         except Exception as e:
-            logger.warning(f"API request failed for storage pricing: {str(e)}")
+            logger.warning("API request failed for storage pricing: %s", e)
 
-        logger.warning(f"Could not find pricing for storage type: {account_type}")
+        logger.warning("Could not find pricing for storage type: %s", account_type)
         return None
 
+    @_memoize_lookup
     def get_managed_disk_price(self, 
                              storage_type: str, 
                              size_gb: int, 
                              region: str) -> Optional[Dict[str, Any]]:
         """Get pricing for a managed disk."""
         logger.info(
-            f"Getting managed disk price for type={storage_type}, "
-            f"size={size_gb}GB, region={region}"
+            "Getting managed disk price for type=%s, size=%sGB, region=%s",
+            storage_type, size_gb, region
         )
 
-        # Determine disk tier based on size
-        if size_gb <= 32:
-            tier = 'P4'
-        elif size_gb <= 64:
-            tier = 'P6'
-        elif size_gb <= 128:
-            tier = 'P10'
-        elif size_gb <= 256:
-            tier = 'P15'
-        else:
-            tier = 'P20'
+        tier = self._disk_tier(size_gb)
 
         # Use standard pricing if available
         disk_prices = self.DISK_PRICING.get(storage_type, {})
@@ -150,45 +305,161 @@ class AzurePricingClient:
         # If not in standard pricing, try API
         try:
             price_data = self._fetch_price(
-                serviceName='Managed Disks',
-                armRegionName=region,
-                skuName=storage_type,
-                tierName=tier
+                **self.managed_disk_price_spec(storage_type, size_gb, region)
             )
             if price_data:
                 return price_data
         except Exception as e:
-            logger.warning(f"API request failed for disk pricing: {str(e)}")
+            logger.warning("API request failed for disk pricing: %s", e)
 
         logger.warning(
-            f"Could not find pricing for disk type={storage_type}, "
-            f"tier={tier}"
+            "Could not find pricing for disk type=%s, tier=%s", storage_type, tier
         )
         return None
 
+    def vm_price_spec(self, size: str, region: str) -> Optional[Dict[str, str]]:
+        """Get the API filters for a VM size, or None if priced statically."""
+        if self.VM_PRICING.get(size):
+            return None
+        return {
+            'serviceName': 'Virtual Machines',
+            'armRegionName': region,
+            'skuName': size
+        }
+
+    def storage_price_spec(self, 
+                           account_type: str, 
+                           region: str) -> Optional[Dict[str, str]]:
+        """Get the API filters for a storage type, or None if priced statically."""
+        if self.STORAGE_PRICING.get(account_type):
+            return None
+        return {
+            'serviceName': 'Storage',
+            'armRegionName': region,
+            'skuName': account_type
+        }
+
+    def managed_disk_price_spec(self, 
+                                storage_type: str, 
+                                size_gb: int, 
+                                region: str) -> Optional[Dict[str, str]]:
+        """Get the API filters for a managed disk, or None if priced statically."""
+        tier = self._disk_tier(size_gb)
+        if self.DISK_PRICING.get(storage_type, {}).get(tier):
+            return None
+        return {
+            'serviceName': 'Managed Disks',
+            'armRegionName': region,
+            'skuName': storage_type,
+            'tierName': tier
+        }
+
+    def prefetch(self, specs: List[Dict[str, str]]) -> None:
+        """Warm the cache for many price lookups using batched API queries.
+
+        Specs are the filter dictionaries accepted by ``_fetch_price``. They are
+        grouped by region, and each group is fetched with a single ``$filter``
+        that OR-joins the per-spec predicates, so related lookups such as a VM
+        and its OS disk share a round trip and the per-resource lookups that
+        follow are served from the cache.
+
+        Args:
+            specs: Filter dictionaries for the prices that will be needed.
+        """
+        groups: Dict[str, Dict[str, Dict[str, str]]] = {}
+        for spec in specs:
+            cache_key, _ = _spec_filter(spec)
+            if self._get_cached(cache_key) is not None:
+                continue
+            group = groups.setdefault(_normalize(spec['armRegionName']), {})
+            group[cache_key] = spec
+
+        for region, pending in groups.items():
+            pending_items = list(pending.items())
+            for start in range(0, len(pending_items), self.PREFETCH_BATCH_SIZE):
+                batch = dict(pending_items[start:start + self.PREFETCH_BATCH_SIZE])
+                try:
+                    self._fetch_batch(region, batch)
+                except Exception as e:
+                    logger.warning("Batched API request failed for %s: %s", region, e)
+
+    def _fetch_batch(self, region: str, pending: Dict[str, Dict[str, str]]) -> None:
+        """Fetch and cache prices for a batch of specs sharing a region."""
+        predicates = " or ".join(
+            "({})".format(_build_filter(
+                spec.get('serviceName'), None, spec.get('skuName'), spec.get('tierName')
+            )[1])
+            for spec in pending.values()
+        )
+        _, region_filter = _build_filter(None, region)
+        filter_string = f"{region_filter} and ({predicates})"
+
+        url: Optional[str] = self.BASE_URL
+        params: Optional[Dict[str, str]] = {'$filter': filter_string}
+        pages = 0
+        while url and pending and pages < self.PREFETCH_MAX_PAGES:
+            pages += 1
+            response = self._session.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+
+            for item in data.get('Items') or []:
+                for cache_key, spec in list(pending.items()):
+                    if self._item_matches(item, spec):
+                        self._set_cached(cache_key, item)
+                        del pending[cache_key]
+
+            # NextPageLink already carries the filter and paging token
+            url, params = data.get('NextPageLink'), None
+
+        if pending and not url:
+            # Every page was read, so the API has no price for these specs.
+            # Remember that briefly so each resource doesn't query them again.
+            expiry = time.monotonic() + self.MISS_CACHE_DURATION.total_seconds()
+            with self._lock:
+                for cache_key in pending:
+                    self._misses[cache_key] = expiry
+            logger.debug(
+                "%d prices not found in batched query for %s", len(pending), region
+            )
+        elif pending:
+            # Paging was cut short; leave these to the single lookup in _fetch_price
+            logger.debug(
+                "%d prices not reached in batched query for %s", len(pending), region
+            )
+
+    @staticmethod
+    def _item_matches(item: Dict[str, Any], spec: Dict[str, str]) -> bool:
+        """Check whether a price item satisfies the filters of a spec."""
+        service = (spec.get('serviceName') or '').strip()
+        if service and service != item.get('serviceName'):
+            return False
+        sku = (spec.get('skuName') or '').strip()
+        if sku and sku not in (item.get('skuName') or ''):
+            return False
+        tier = (spec.get('tierName') or '').strip()
+        if tier and tier not in (item.get('productName') or ''):
+            return False
+        return True
+
+    @classmethod
+    def _disk_tier(cls, size_gb: int) -> str:
+        """Determine the smallest disk tier that fits a disk size."""
+        return cls.DISK_TIERS[bisect.bisect_left(cls._DISK_TIER_SIZES, size_gb)][1]
+
     def _fetch_price(self, **filters) -> Optional[Dict[str, Any]]:
         """Fetch pricing data from Azure Pricing API."""
-        cache_key = "|".join(f"{k}={v}" for k, v in sorted(filters.items()))
+        cache_key, filter_string = _spec_filter(filters)
         
         # Check cache first
-        if cache_key in self._cache:
-            age = datetime.now() - self._cache_timestamps[cache_key]
-            if age < self.CACHE_DURATION:
-                return self._cache[cache_key]
-
-        # Build filter string
-        filter_parts = []
-        for k, v in filters.items():
-            if k == 'armRegionName':
-                filter_parts.append(f"armRegionName eq '{v.lower()}'")
-            elif k == 'serviceName':
-                filter_parts.append(f"serviceName eq '{v}'")
-            elif k == 'skuName':
-                filter_parts.append(f"contains(skuName, '{v}')")
-            elif k == 'tierName':
-                filter_parts.append(f"contains(productName, '{v}')")
-
-        filter_string = " and ".join(filter_parts)
+        price_data = self._get_cached(cache_key)
+        if price_data is not None:
+            return price_data
+
+        with self._lock:
+            if self._misses.get(cache_key, 0.0) > time.monotonic():
+                return None
+
         params = {'$filter': filter_string}
 
         # Make API request
@@ -198,14 +469,104 @@ class AzurePricingClient:
 
         if data.get('Items'):
             price_data = data['Items'][0]
-            self._cache[cache_key] = price_data
-            self._cache_timestamps[cache_key] = datetime.now()
+            self._set_cached(cache_key, price_data)
             return price_data
 
         return None
 
+    def _get_cached(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get unexpired price data from memory, falling back to the disk cache."""
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+            if self._store is None or self._refresh_cache:
+                return None
+
+            try:
+                row = self._store.execute(
+                    "SELECT fetched_at, price_data FROM prices WHERE cache_key = ?",
+                    (cache_key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Could not read pricing cache entry: %s", e)
+                return None
+
+            if row is None:
+                return None
+
+            # Entries on disk carry wall-clock timestamps across runs
+            fetched_at, price_json = row
+            remaining = self.CACHE_DURATION.total_seconds() - (time.time() - fetched_at)
+            if remaining > 0:
+                price_data = json.loads(price_json)
+                self._cache[cache_key] = (time.monotonic() + remaining, price_data)
+                return price_data
+
+        return None
+
+    def _set_cached(self, cache_key: str, price_data: Dict[str, Any]) -> None:
+        """Store price data in memory and write it through to the disk cache."""
+        expiry = time.monotonic() + self.CACHE_DURATION.total_seconds()
+        with self._lock:
+            self._cache[cache_key] = (expiry, price_data)
+
+            if self._store is not None:
+                try:
+                    self._store.execute(
+                        "INSERT OR REPLACE INTO prices VALUES (?, ?, ?)",
+                        (cache_key, time.time(), json.dumps(price_data))
+                    )
+                except sqlite3.Error as e:
+                    logger.warning("Could not write pricing cache entry: %s", e)
+
+    @staticmethod
+    def _open_store(cache_file: str) -> Optional[sqlite3.Connection]:
+        """Open the on-disk pricing cache, or return None if it's unavailable.
+
+        SQLite lets concurrent runs (e.g. parallel CI jobs) share the cache,
+        which a shelve file does not.
+        """
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            # Autocommit; access from worker threads is serialized by _lock
+            store = sqlite3.connect(
+                cache_file, check_same_thread=False, isolation_level=None
+            )
+            store.execute("PRAGMA journal_mode=WAL")
+            store.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                "cache_key TEXT PRIMARY KEY, "
+                "fetched_at REAL NOT NULL, "
+                "price_data TEXT NOT NULL)"
+            )
+            return store
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(
+                "Pricing cache %s unavailable, caching in memory only: %s", cache_file, e
+            )
+            return None
+
     def clear_cache(self) -> None:
         """Clear the pricing cache."""
-        self._cache.clear()
-        self._cache_timestamps.clear()
+        with self._lock:
+            self._cache.clear()
+            self._lookups.clear()
+            self._misses.clear()
+            if self._store is not None:
+                try:
+                    self._store.execute("DELETE FROM prices")
+                except sqlite3.Error as e:
+                    # Stop reading the entries that should have been cleared
+                    self._refresh_cache = True
+                    logger.warning("Could not clear pricing cache: %s", e)
         logger.debug("Pricing cache cleared")
+
+    def close(self) -> None:
+        """Close the on-disk pricing cache and release the HTTP session."""
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+        self._session.close()
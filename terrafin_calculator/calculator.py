@@ -5,19 +5,27 @@ This module combines the plan parser, pricing client, and resource handlers
 to calculate total estimated costs for Azure resources in a Terraform plan.
 """
 
+import json
+import math
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from .plan_parser import PlanParser
 from .azure_pricing import AzurePricingClient
-from .resource_handlers import get_handler
+from .resource_handlers import ZERO_COST_RESOURCE_TYPES, ResourceHandler, get_handler
+
+try:
+    import orjson
+except ImportError:  # Optional, speeds up JSON reports
+    orjson = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ResourceCost:
     """Data class for resource cost details."""
     address: str
@@ -27,7 +35,7 @@ class ResourceCost:
     details: Dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CostBreakdown:
     """Data class for overall cost breakdown."""
     resources: List[ResourceCost]
@@ -38,14 +46,20 @@ class CostBreakdown:
 class CostCalculator:
     """Calculator for Azure resource costs from Terraform plans."""
 
-    def __init__(self, plan_file: str):
+    # Concurrent resource cost calculations, matched to the pricing client's
+    # connection pool so every worker gets a keep-alive connection
+    MAX_WORKERS = AzurePricingClient.POOL_MAXSIZE
+
+    def __init__(self, plan_file: str, refresh_cache: bool = False):
         """Initialize the cost calculator.
 
         Args:
             plan_file: Path to the Terraform plan JSON file.
+            refresh_cache: Re-fetch prices instead of reading them from the
+                on-disk cache.
         """
         self.plan_parser = PlanParser(plan_file)
-        self.pricing_client = AzurePricingClient()
+        self.pricing_client = AzurePricingClient(refresh_cache=refresh_cache)
         self.cost_threshold: Optional[float] = None
 
     def set_cost_threshold(self, threshold: float) -> None:
@@ -72,42 +86,61 @@ class CostCalculator:
         resource_changes = self.plan_parser.get_resource_changes()
         logger.info(f"Found {len(resource_changes)} resource changes to analyze")
 
+        # Resolve each resource type's handler once; handlers are stateless.
+        # Types with no direct cost skip handler dispatch entirely.
+        handlers = {
+            resource_type: get_handler(resource_type, self.pricing_client)
+            for resource_type in {r.get('type', '') for r in resource_changes}
+            if resource_type not in ZERO_COST_RESOURCE_TYPES
+        }
+
+        self._prefetch_prices(resource_changes, handlers)
+
         resource_costs: List[ResourceCost] = []
         unknown_costs: List[str] = []
-        total_cost = 0.0
 
-        for resource in resource_changes:
+        # Handlers block on pricing lookups, so cost resources concurrently
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures: List[Optional[Future]] = []
+            for resource in resource_changes:
+                handler = handlers.get(resource.get('type', ''))
+                futures.append(
+                    executor.submit(handler.calculate_cost, resource) if handler else None
+                )
+
+        # Collect results in plan order so reports are stable between runs
+        for resource, future in zip(resource_changes, futures):
+            address = resource.get('address') or 'Unknown resource'
             resource_type = resource.get('type', '')
-            handler = get_handler(resource_type, self.pricing_client)
 
-            if not handler:
+            if future:
+                try:
+                    monthly_cost = future.result()
+                except Exception as e:
+                    logger.error(f"Error calculating cost for {address}: {str(e)}")
+                    unknown_costs.append(address)
+                    continue
+            elif resource_type in ZERO_COST_RESOURCE_TYPES:
+                monthly_cost = 0.0
+            else:
                 logger.warning(f"No cost handler available for resource type: {resource_type}")
-                unknown_costs.append(resource.get('address', 'Unknown resource'))
+                unknown_costs.append(address)
                 continue
 
-            try:
-                monthly_cost = handler.calculate_cost(resource)
-                
-                if monthly_cost is not None:
-                    total_cost += monthly_cost
-                    resource_costs.append(ResourceCost(
-                        address=resource.get('address', ''),
-                        type=resource_type,
-                        name=resource.get('name', ''),
-                        monthly_cost=monthly_cost,
-                        details=self._extract_cost_details(resource)
-                    ))
-                else:
-                    unknown_costs.append(resource.get('address', 'Unknown resource'))
-                    logger.warning(
-                        f"Could not determine cost for resource: {resource.get('address')}"
-                    )
-
-            except Exception as e:
-                logger.error(
-                    f"Error calculating cost for {resource.get('address')}: {str(e)}"
-                )
-                unknown_costs.append(resource.get('address', 'Unknown resource'))
+            if monthly_cost is not None:
+                resource_costs.append(ResourceCost(
+                    address=address,
+                    type=resource_type,
+                    name=resource.get('name', ''),
+                    monthly_cost=monthly_cost,
+                    details=self._extract_cost_details(resource)
+                ))
+            else:
+                unknown_costs.append(address)
+                logger.warning(f"Could not determine cost for resource: {address}")
+
+        # Sum once all costs are known; fsum avoids accumulating rounding error
+        total_cost = math.fsum(cost.monthly_cost for cost in resource_costs)
 
         return CostBreakdown(
             resources=resource_costs,
@@ -115,6 +148,36 @@ class CostCalculator:
             unknown_costs=unknown_costs
         )
 
+    def close(self) -> None:
+        """Release the pricing client's cache connection and HTTP session."""
+        self.pricing_client.close()
+
+    def _prefetch_prices(self, 
+                         resource_changes: List[Dict[str, Any]],
+                         handlers: Dict[str, Optional[ResourceHandler]]) -> None:
+        """Prefetch the API prices needed by the handlers in batches.
+
+        Args:
+            resource_changes: Resource configurations from the plan.
+            handlers: Handler for each resource type in the plan.
+        """
+        specs: List[Dict[str, str]] = []
+        for resource in resource_changes:
+            handler = handlers.get(resource.get('type', ''))
+            if not handler:
+                continue
+            try:
+                specs.extend(handler.get_price_specs(resource))
+            except Exception as e:
+                # Resources with bad configs are reported when costed below
+                logger.debug(
+                    f"Skipping price prefetch for {resource.get('address')}: {str(e)}"
+                )
+
+        if specs:
+            logger.info(f"Prefetching {len(specs)} prices from the pricing API")
+            self.pricing_client.prefetch(specs)
+
     def _extract_cost_details(self, resource: Dict[str, Any]) -> Dict[str, Any]:
         """Extract relevant details for cost reporting.
 
@@ -124,15 +187,11 @@ class CostCalculator:
         Returns:
             Dictionary of relevant cost-related details.
         """
-        details = {
-            'location': resource.get('location'),
-            'size': resource.get('size'),
-            'sku': resource.get('sku'),
-            'tier': resource.get('tier'),
+        return {
+            k: v
+            for k in ('location', 'size', 'sku', 'tier')
+            if (v := resource.get(k)) is not None
         }
-        
-        # Filter out None values
-        return {k: v for k, v in details.items() if v is not None}
 
     def validate_cost_threshold(self, breakdown: CostBreakdown) -> bool:
         """Check if the total cost is within the threshold.
@@ -259,8 +318,6 @@ class CostCalculator:
         Returns:
             JSON formatted report.
         """
-        import json
-
         report = {
             "resources": [
                 {
@@ -276,4 +333,9 @@ class CostCalculator:
             "total_monthly_cost": breakdown.total_monthly_cost
         }
 
-        return json.dumps(report, indent=2)
+        # Both paths write non-ASCII addresses as raw UTF-8. They only differ
+        # for float values costs never take: NaN/Infinity (orjson writes null) and
+        # exponent notation (1e16 vs 1e+16).
+        if orjson is not None:
+            return orjson.dumps(report, option=orjson.OPT_INDENT_2).decode()
+        return json.dumps(report, indent=2, ensure_ascii=False)
@@ -4,9 +4,11 @@ Terraform plan parser module.
 This module handles parsing and extracting resource information from Terraform plan JSON files.
 """
 
-import json
+import codecs
 from typing import Dict, List, Optional, Any
 
+import ijson
+
 
 class PlanParser:
     """Parser for Terraform plan JSON files."""
@@ -18,23 +20,32 @@ class PlanParser:
             plan_file: Path to the Terraform plan JSON file.
         """
         self.plan_file = plan_file
-        self.plan_data: Optional[Dict[str, Any]] = None
+        self._resource_changes: Optional[List[Dict[str, Any]]] = None
 
     def load_plan(self) -> None:
         """Load and parse the Terraform plan JSON file.
 
+        The plan is stream-parsed and only the resource changes being created
+        or updated are kept, so memory use doesn't grow with the rest of the
+        plan.
+
         Raises:
             FileNotFoundError: If the plan file doesn't exist.
-            json.JSONDecodeError: If the plan file contains invalid JSON.
+            ValueError: If the plan file contains invalid JSON.
         """
-        try:
-            # Try UTF-8 with BOM first
-            with open(self.plan_file, 'r', encoding='utf-8-sig') as f:
-                self.plan_data = json.load(f)
-        except (UnicodeError, json.JSONDecodeError):
-            # Fall back to regular UTF-8
-            with open(self.plan_file, 'r', encoding='utf-8') as f:
-                self.plan_data = json.load(f)
+        with open(self.plan_file, 'rb') as f:
+            # Skip the UTF-8 BOM if present, the parser rejects it
+            if f.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+                f.seek(0)
+
+            try:
+                self._resource_changes = [
+                    self._extract_resource_config(change)
+                    for change in ijson.items(f, 'resource_changes.item', use_float=True)
+                    if change.get('change', {}).get('actions') in [['create'], ['update']]
+                ]
+            except ijson.JSONError as e:
+                raise ValueError(f"Invalid JSON in plan file {self.plan_file}: {str(e)}") from e
 
     def get_resource_changes(self) -> List[Dict[str, Any]]:
         """Extract resource changes from the plan.
@@ -45,18 +56,10 @@ class PlanParser:
         Raises:
             ValueError: If plan data hasn't been loaded.
         """
-        if not self.plan_data:
+        if self._resource_changes is None:
             raise ValueError("Plan data not loaded. Call load_plan() first.")
 
-        resource_changes = []
-        
-        # Extract resource changes from the planned_values section
-        if 'resource_changes' in self.plan_data:
-            for change in self.plan_data['resource_changes']:
-                if change.get('change', {}).get('actions') in [['create'], ['update']]:
-                    resource_changes.append(self._extract_resource_config(change))
-
-        return resource_changes
+        return self._resource_changes
 
     def _extract_resource_config(self, change: Dict[str, Any]) -> Dict[str, Any]:
         """Extract relevant configuration from a resource change.
@@ -102,9 +105,6 @@ class PlanParser:
         Raises:
             ValueError: If plan data hasn't been loaded.
         """
-        if not self.plan_data:
-            raise ValueError("Plan data not loaded. Call load_plan() first.")
-
         return len(self.get_resource_changes())
 
     def get_resource_types(self) -> List[str]:
@@ -116,9 +116,6 @@ class PlanParser:
         Raises:
             ValueError: If plan data hasn't been loaded.
         """
-        if not self.plan_data:
-            raise ValueError("Plan data not loaded. Call load_plan() first.")
-
         return list(set(
             change['type'] 
             for change in self.get_resource_changes()
@@ -7,11 +7,29 @@ their estimated costs based on their configurations and pricing data.
 
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, Type
+from types import MappingProxyType
+from weakref import WeakValueDictionary
+from typing import Dict, Any, FrozenSet, List, Mapping, Optional, Tuple, Type
 from .azure_pricing import AzurePricingClient
 
 logger = logging.getLogger(__name__)
 
+
+# Terraform accepts display names ("East US") as well as ARM region names
+# ("eastus"), but the pricing API only knows the latter. Plans repeat the same
+# few locations, so each spelling is canonicalized once.
+_LOC_CANON: Dict[str, str] = {}
+
+
+def _canon_location(location: str) -> str:
+    """Convert a location to its ARM region name, e.g. "East US" -> "eastus"."""
+    try:
+        return _LOC_CANON[location]
+    except KeyError:
+        canonical = _LOC_CANON[location] = location.lower().replace(' ', '')
+        return canonical
+
+
 class ResourceHandler(ABC):
     """Abstract base class for resource handlers."""
 
@@ -24,25 +42,70 @@ class ResourceHandler(ABC):
         """Calculate the monthly cost for a resource."""
         pass
 
-    def _get_location(self, resource_config: Dict[str, Any]) -> Optional[str]:
-        """Extract location from resource configuration."""
-        location = resource_config.get('raw_values', {}).get('location')
-        if not location:
-            location = resource_config.get('location')
-        return location
+    def get_price_specs(self, resource_config: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Get the pricing API lookups needed to cost a resource.
+
+        The calculator gathers these for the whole plan and prefetches them in
+        batches. Handlers that don't query the pricing API return no specs.
+        """
+        return []
+
+    @staticmethod
+    def _extract(resource_config: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Extract the raw values and location from resource configuration."""
+        raw_values = resource_config.get('raw_values', {})
+        location = raw_values.get('location') or resource_config.get('location')
+        return raw_values, _canon_location(location) if location else None
 
 
 class VirtualMachineHandler(ResourceHandler):
     """Handler for Azure Virtual Machine resources."""
 
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a virtual machine."""
-        raw_values = resource_config.get('raw_values', {})
-        size = raw_values.get('size')
-        location = self._get_location(resource_config)
+    OS_DISK_SIZE_GB = 128  # Default OS disk size
+
+    @staticmethod
+    def _os_disk_type(raw_values: Dict[str, Any]) -> Optional[str]:
+        """Get the OS disk storage type, if the VM declares an OS disk."""
+        os_disk = raw_values.get('os_disk')
+        return os_disk[0].get('storage_account_type') if os_disk else None
 
+    def _lookup_args(self,
+                     resource_config: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+        """Get the VM size, location and OS disk type to price a VM with.
+
+        Raises:
+            ValueError: If the size or location is missing.
+        """
+        raw_values, location = self._extract(resource_config)
+        size = raw_values.get('size')
         if not (size and location):
-            logger.warning(f"Missing required VM parameters: size={size}, location={location}")
+            raise ValueError(
+                f"Missing required VM parameters: size={size}, location={location}"
+            )
+        return size, location, self._os_disk_type(raw_values)
+
+    def get_price_specs(self, resource_config: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Get the VM and OS disk pricing lookups for a virtual machine."""
+        try:
+            size, location, disk_type = self._lookup_args(resource_config)
+        except ValueError:
+            return []
+
+        specs = [self.pricing_client.vm_price_spec(size, location)]
+        if disk_type:
+            specs.append(
+                self.pricing_client.managed_disk_price_spec(
+                    disk_type, self.OS_DISK_SIZE_GB, location
+                )
+            )
+        return [spec for spec in specs if spec]
+
+    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
+        """Calculate monthly cost for a virtual machine."""
+        try:
+            size, location, disk_type = self._lookup_args(resource_config)
+        except ValueError as e:
+            logger.warning("%s", e)
             return None
 
         try:
@@ -53,61 +116,76 @@ class VirtualMachineHandler(ResourceHandler):
                 # Convert hourly rate to monthly (assuming 730 hours per month)
                 hourly_rate = float(price_data.get('retailPrice', 0))
                 monthly_cost = hourly_rate * 730
-                logger.info(f"Base VM cost: ${monthly_cost:.2f}/month")
+                logger.info("Base VM cost: $%.2f/month", monthly_cost)
             else:
-                logger.warning(f"Could not determine base VM cost for size={size}")
+                logger.warning("Could not determine base VM cost for size=%s", size)
                 return None
 
             # Add OS disk cost
-            os_disk = raw_values.get('os_disk', [{}])[0]
-            disk_type = os_disk.get('storage_account_type')
             if disk_type:
                 disk_price = self.pricing_client.get_managed_disk_price(
                     disk_type, 
-                    128,  # Default OS disk size
+                    self.OS_DISK_SIZE_GB,
                     location
                 )
                 if disk_price:
                     disk_cost = float(disk_price.get('retailPrice', 0))
                     monthly_cost += disk_cost
-                    logger.info(f"OS disk cost: ${disk_cost:.2f}/month")
+                    logger.info("OS disk cost: $%.2f/month", disk_cost)
                 else:
-                    logger.warning(f"Could not determine OS disk cost for type={disk_type}")
+                    logger.warning("Could not determine OS disk cost for type=%s", disk_type)
 
-            logger.info(f"Total VM cost: ${monthly_cost:.2f}/month")
+            logger.info("Total VM cost: $%.2f/month", monthly_cost)
             return monthly_cost
 
         except Exception as e:
-            logger.error(f"Error calculating VM cost: {str(e)}")
+            logger.error("Error calculating VM cost: %s", e)
             return None
 
 
 class StorageAccountHandler(ResourceHandler):
     """Handler for Azure Storage Account resources."""
 
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a storage account."""
-        raw_values = resource_config.get('raw_values', {})
+    def _lookup_args(self, resource_config: Dict[str, Any]) -> Tuple[str, str]:
+        """Get the account type (e.g. "Standard_LRS") and location to price with.
+
+        Raises:
+            ValueError: If the tier, replication type or location is missing.
+        """
+        raw_values, location = self._extract(resource_config)
         account_tier = raw_values.get('account_tier', '')
         replication_type = raw_values.get('account_replication_type', '')
-        location = self._get_location(resource_config)
-
         if not all([account_tier, replication_type, location]):
-            logger.warning(
-                "Missing required storage parameters: "
-                f"tier={account_tier}, replication={replication_type}, location={location}"
+            raise ValueError(
+                f"Missing required storage parameters: tier={account_tier}, "
+                f"replication={replication_type}, location={location}"
             )
-            return None
+        return f"{account_tier}_{replication_type}", location
+
+    def get_price_specs(self, resource_config: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Get the pricing lookup for a storage account."""
+        try:
+            account_type, location = self._lookup_args(resource_config)
+        except ValueError:
+            return []
 
-        # Construct the account type (e.g., "Standard_LRS")
-        account_type = f"{account_tier}_{replication_type}"
+        spec = self.pricing_client.storage_price_spec(account_type, location)
+        return [spec] if spec else []
+
+    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
+        """Calculate monthly cost for a storage account."""
+        try:
+            account_type, location = self._lookup_args(resource_config)
+        except ValueError as e:
+            logger.warning("%s", e)
+            return None
 
         try:
             price_data = self.pricing_client.get_storage_price(account_type, location)
             if not price_data:
                 logger.warning(
-                    f"No pricing data found for storage type={account_type}, "
-                    f"location={location}"
+                    "No pricing data found for storage type=%s, location=%s",
+                    account_type, location
                 )
                 return None
 
@@ -115,29 +193,51 @@ class StorageAccountHandler(ResourceHandler):
             estimated_gb = 100
             price_per_gb = float(price_data.get('retailPrice', 0))
             monthly_cost = price_per_gb * estimated_gb
-            logger.info(f"Storage cost: ${monthly_cost:.2f}/month (estimated {estimated_gb}GB)")
+            logger.info("Storage cost: $%.2f/month (estimated %sGB)", monthly_cost, estimated_gb)
             return monthly_cost
 
         except Exception as e:
-            logger.error(f"Error calculating storage cost: {str(e)}")
+            logger.error("Error calculating storage cost: %s", e)
             return None
 
 
 class ManagedDiskHandler(ResourceHandler):
     """Handler for Azure Managed Disk resources."""
 
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a managed disk."""
-        raw_values = resource_config.get('raw_values', {})
+    def _lookup_args(self, resource_config: Dict[str, Any]) -> Tuple[str, int, str]:
+        """Get the storage type, size in GB and location to price a disk with.
+
+        Raises:
+            ValueError: If the type, size or location is missing or invalid.
+        """
+        raw_values, location = self._extract(resource_config)
         storage_type = raw_values.get('storage_account_type')
         disk_size_gb = int(raw_values.get('disk_size_gb', 0))
-        location = self._get_location(resource_config)
-
         if not all([storage_type, location, disk_size_gb]):
-            logger.warning(
-                "Missing required disk parameters: "
-                f"type={storage_type}, size={disk_size_gb}, location={location}"
+            raise ValueError(
+                f"Missing required disk parameters: type={storage_type}, "
+                f"size={disk_size_gb}, location={location}"
             )
+        return storage_type, disk_size_gb, location
+
+    def get_price_specs(self, resource_config: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Get the pricing lookup for a managed disk."""
+        try:
+            storage_type, disk_size_gb, location = self._lookup_args(resource_config)
+        except ValueError:
+            return []
+
+        spec = self.pricing_client.managed_disk_price_spec(
+            storage_type, disk_size_gb, location
+        )
+        return [spec] if spec else []
+
+    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
+        """Calculate monthly cost for a managed disk."""
+        try:
+            storage_type, disk_size_gb, location = self._lookup_args(resource_config)
+        except ValueError as e:
+            logger.warning("%s", e)
             return None
 
         try:
@@ -149,54 +249,23 @@ class ManagedDiskHandler(ResourceHandler):
 
             if not price_data:
                 logger.warning(
-                    f"No pricing data found for disk type={storage_type}, "
-                    f"size={disk_size_gb}GB, location={location}"
+                    "No pricing data found for disk type=%s, size=%sGB, location=%s",
+                    storage_type, disk_size_gb, location
                 )
                 return None
 
             monthly_cost = float(price_data.get('retailPrice', 0))
-            logger.info(f"Managed disk cost: ${monthly_cost:.2f}/month")
+            logger.info("Managed disk cost: $%.2f/month", monthly_cost)
             return monthly_cost
 
         except Exception as e:
-            logger.error(f"Error calculating disk cost: {str(e)}")
+            logger.error("Error calculating disk cost: %s", e)
             return None
 
 
-class NetworkInterfaceHandler(ResourceHandler):
-    """Handler for Azure Network Interface resources."""
-
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a network interface."""
-        logger.info("Network interfaces have no direct cost")
-        return 0.0
-
-
-class VirtualNetworkHandler(ResourceHandler):
-    """Handler for Azure Virtual Network resources."""
-
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a virtual network."""
-        logger.info("Virtual networks have no direct cost")
-        return 0.0
-
-
-class SubnetHandler(ResourceHandler):
-    """Handler for Azure Subnet resources."""
-
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a subnet."""
-        logger.info("Subnets have no direct cost")
-        return 0.0
-
-
-class ResourceGroupHandler(ResourceHandler):
-    """Handler for Azure Resource Group resources."""
-
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a resource group."""
-        logger.info("Resource groups have no direct cost")
-        return 0.0
+# Logic App estimate: 100,000 executions per month using standard connectors
+_LOGIC_APP_EXECUTIONS = 100000
+_LOGIC_APP_COST_PER_EXECUTION = 0.000125
 
 
 class LogicAppHandler(ResourceHandler):
@@ -212,40 +281,20 @@ class LogicAppHandler(ResourceHandler):
         
         Estimating 100,000 executions per month with standard connectors
         """
-        try:
-            # Estimate 100,000 executions per month using standard connectors
-            executions = 100000
-            cost_per_execution = 0.000125
-            monthly_cost = executions * cost_per_execution
-            logger.info(f"Logic App cost: ${monthly_cost:.2f}/month (estimated {executions} executions)")
-            return monthly_cost
-        except Exception as e:
-            logger.error(f"Error calculating Logic App cost: {str(e)}")
-            return None
-
-
-class LogicAppActionHandler(ResourceHandler):
-    """Handler for Azure Logic App Action resources."""
-
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a Logic App Action.
-        
-        Actions are included in the Logic App workflow cost
-        """
-        logger.info("Logic App Actions are included in the Logic App workflow cost")
-        return 0.0
-
+        monthly_cost = _LOGIC_APP_EXECUTIONS * _LOGIC_APP_COST_PER_EXECUTION
+        logger.info(
+            "Logic App cost: $%.2f/month (estimated %s executions)",
+            monthly_cost, _LOGIC_APP_EXECUTIONS
+        )
+        return monthly_cost
 
-class LogicAppTriggerHandler(ResourceHandler):
-    """Handler for Azure Logic App Trigger resources."""
 
-    def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
-        """Calculate monthly cost for a Logic App Trigger.
-        
-        Triggers are included in the Logic App workflow cost
-        """
-        logger.info("Logic App Triggers are included in the Logic App workflow cost")
-        return 0.0
+# Basic App Service Plan pricing tiers (monthly)
+_APP_SERVICE_PLAN_PRICES: Mapping[str, float] = MappingProxyType({
+    'B1': 54.75,
+    'B2': 109.50,
+    'B3': 218.99,
+})
 
 
 class AppServicePlanHandler(ResourceHandler):
@@ -253,7 +302,7 @@ class AppServicePlanHandler(ResourceHandler):
 
     def calculate_cost(self, resource_config: Dict[str, Any]) -> Optional[float]:
         """Calculate monthly cost for an App Service Plan."""
-        raw_values = resource_config.get('raw_values', {})
+        raw_values, location = self._extract(resource_config)
 
         # sku can be provided as "sku_name" or inside a "sku" block depending on
         # the Terraform resource version. Support both to avoid missing pricing.
@@ -265,38 +314,39 @@ class AppServicePlanHandler(ResourceHandler):
             if isinstance(sku_info, dict):
                 sku = sku_info.get('size') or sku_info.get('name')
 
-        location = self._get_location(resource_config)
-
         if not (sku and location):
             logger.warning(
-                f"Missing required App Service Plan parameters: sku={sku}, location={location}"
+                "Missing required App Service Plan parameters: sku=%s, location=%s",
+                sku, location
             )
             return None
 
         try:
-            # Basic pricing tiers (monthly):
-            # B1: $54.75
-            # B2: $109.50
-            # B3: $218.99
-            sku_prices = {
-                'B1': 54.75,
-                'B2': 109.50,
-                'B3': 218.99,
-            }
-            
-            monthly_cost = sku_prices.get(sku.upper(), 0)
+            monthly_cost = _APP_SERVICE_PLAN_PRICES.get(sku.upper(), 0)
             if monthly_cost:
-                logger.info(f"App Service Plan cost: ${monthly_cost:.2f}/month")
+                logger.info("App Service Plan cost: $%.2f/month", monthly_cost)
                 return monthly_cost
             else:
-                logger.warning(f"Could not determine App Service Plan cost for SKU={sku}")
+                logger.warning("Could not determine App Service Plan cost for SKU=%s", sku)
                 return None
 
         except Exception as e:
-            logger.error(f"Error calculating App Service Plan cost: {str(e)}")
+            logger.error("Error calculating App Service Plan cost: %s", e)
             return None
 
 
+# Resource types with no direct cost. Logic App actions and triggers are
+# included in the Logic App workflow cost. These are costed at $0.00 without
+# a handler.
+ZERO_COST_RESOURCE_TYPES: FrozenSet[str] = frozenset({
+    'azurerm_network_interface',
+    'azurerm_virtual_network',
+    'azurerm_subnet',
+    'azurerm_resource_group',
+    'azurerm_logic_app_action_custom',
+    'azurerm_logic_app_trigger_custom',
+})
+
 # Registry of resource handlers
 RESOURCE_HANDLERS: Dict[str, Type[ResourceHandler]] = {
     'azurerm_virtual_machine': VirtualMachineHandler,
@@ -304,24 +354,30 @@ RESOURCE_HANDLERS: Dict[str, Type[ResourceHandler]] = {
     'azurerm_linux_virtual_machine': VirtualMachineHandler,
     'azurerm_storage_account': StorageAccountHandler,
     'azurerm_managed_disk': ManagedDiskHandler,
-    'azurerm_network_interface': NetworkInterfaceHandler,
-    'azurerm_virtual_network': VirtualNetworkHandler,
-    'azurerm_subnet': SubnetHandler,
-    'azurerm_resource_group': ResourceGroupHandler,
     'azurerm_logic_app_workflow': LogicAppHandler,
-    'azurerm_logic_app_action_custom': LogicAppActionHandler,
-    'azurerm_logic_app_trigger_custom': LogicAppTriggerHandler,
     'azurerm_service_plan': AppServicePlanHandler,
     'azurerm_app_service_plan': AppServicePlanHandler,
 }
 
 
+# Handler instances by (id of pricing client, handler class). Handlers hold no
+# state besides the client, so one instance per class is shared by every
+# resource it costs. Entries live only as long as their handler, which keeps
+# its client alive, so a client's id can't be reused while its entry exists.
+_HANDLER_INSTANCES: WeakValueDictionary = WeakValueDictionary()
+
+
 def get_handler(resource_type: str, 
                 pricing_client: AzurePricingClient) -> Optional[ResourceHandler]:
     """Get the appropriate handler for a resource type."""
-    handler_class = RESOURCE_HANDLERS.get(resource_type)
-    if handler_class:
-        return handler_class(pricing_client)
-    
-    logger.warning(f"No handler available for resource type: {resource_type}")
-    return None
+    try:
+        handler_class = RESOURCE_HANDLERS[resource_type]
+    except KeyError:
+        logger.warning("No handler available for resource type: %s", resource_type)
+        return None
+
+    key = (id(pricing_client), handler_class)
+    handler = _HANDLER_INSTANCES.get(key)
+    if handler is None:
+        handler = _HANDLER_INSTANCES[key] = handler_class(pricing_client)
+    return handler
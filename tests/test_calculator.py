@@ -2,10 +2,23 @@
 Tests for the cost calculator module.
 """
 
+import codecs
+import gc
 import json
+import sqlite3
+import weakref
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
+from terrafin_calculator.azure_pricing import AzurePricingClient
 from terrafin_calculator.calculator import CostCalculator, CostBreakdown, ResourceCost
+from terrafin_calculator.plan_parser import PlanParser
+from terrafin_calculator.resource_handlers import ManagedDiskHandler, get_handler
+
+
+@pytest.fixture(autouse=True)
+def isolated_price_cache(tmp_path, monkeypatch):
+    """Keep the on-disk pricing cache out of the user's home directory."""
+    monkeypatch.setenv("TERRAFIN_CACHE_DIR", str(tmp_path / "cache"))
 
 
 @pytest.fixture
@@ -181,6 +194,32 @@ def test_report_formatting(sample_plan_json):
     assert report_data["resources"][0]["monthly_cost"] == 73.0
 
 
+def test_json_report_is_the_same_with_and_without_orjson(sample_plan_json):
+    """Ensure the optional orjson path writes the same report as json."""
+    pytest.importorskip("orjson")
+    calculator = CostCalculator(sample_plan_json)
+    breakdown = CostBreakdown(
+        resources=[
+            ResourceCost(
+                address='azurerm_storage_account.this["café"]',
+                type="azurerm_storage_account",
+                name="this",
+                monthly_cost=2.5,
+                details={"location": "eastus"}
+            )
+        ],
+        total_monthly_cost=2.5,
+        unknown_costs=['azurerm_subnet.this["naïve"]']
+    )
+
+    orjson_report = calculator.format_cost_report(breakdown, 'json')
+    with patch('terrafin_calculator.calculator.orjson', None):
+        json_report = calculator.format_cost_report(breakdown, 'json')
+
+    assert orjson_report == json_report
+    assert 'café' in json_report
+
+
 def test_unknown_resource_handling(sample_plan_json):
     """Test handling of unknown resource types."""
     calculator = CostCalculator(sample_plan_json)
@@ -236,3 +275,392 @@ def test_app_service_plan_with_sku_block(tmp_path):
     breakdown = calculator.calculate_costs()
 
     assert breakdown.total_monthly_cost == pytest.approx(54.75)
+
+
+def test_handlers_are_shared_per_pricing_client():
+    """Ensure handler lookups reuse one instance per handler class and client."""
+    with AzurePricingClient() as client, AzurePricingClient() as other:
+        handler = get_handler("azurerm_linux_virtual_machine", client)
+        assert get_handler("azurerm_windows_virtual_machine", client) is handler
+        assert get_handler("azurerm_linux_virtual_machine", other) is not handler
+        assert get_handler("azurerm_unknown_resource", client) is None
+
+    # Any object with the pricing client's methods works as a client
+    for duck_client in (Mock(), MagicMock(), Mock(spec=AzurePricingClient)):
+        handler = get_handler("azurerm_managed_disk", duck_client)
+        assert isinstance(handler, ManagedDiskHandler)
+        assert handler.pricing_client is duck_client
+
+
+def test_handlers_skip_prefetch_and_costing_without_required_parameters(caplog):
+    """Ensure price specs and costs apply the same parameter validation."""
+    configs = {
+        "azurerm_linux_virtual_machine": {"raw_values": {"location": "eastus"}},
+        "azurerm_storage_account": {"raw_values": {"account_tier": "Standard"}},
+        "azurerm_managed_disk": {"raw_values": {"storage_account_type": "Premium_LRS"}},
+    }
+    with AzurePricingClient() as client:
+        for resource_type, config in configs.items():
+            handler = get_handler(resource_type, client)
+            assert handler.get_price_specs(config) == []
+            assert handler.calculate_cost(config) is None
+
+    assert caplog.text.count("Missing required") == len(configs)
+
+
+def test_handlers_do_not_keep_pricing_client_alive():
+    """Ensure a closed client and its handlers can be garbage collected."""
+    client = AzurePricingClient()
+    handler = get_handler("azurerm_linux_virtual_machine", client)
+    handler.calculate_cost({"raw_values": {"size": "Standard_D2s_v3", "location": "eastus"}})
+    client_ref = weakref.ref(client)
+
+    client.close()
+    del client, handler
+    gc.collect()
+
+    assert client_ref() is None
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_price_lookups_are_memoized_per_client(mock_get):
+    """Ensure repeated lookups are memoized until the cache is cleared."""
+    miss, stale, fresh = Mock(), Mock(), Mock()
+    miss.json.return_value = {"Items": []}
+    stale.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.1}]
+    }
+    fresh.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.2}]
+    }
+    mock_get.side_effect = [miss, stale, fresh]
+
+    with AzurePricingClient() as client:
+        with patch.object(client, '_fetch_price', wraps=client._fetch_price) as fetch:
+            # Misses are retried rather than memoized
+            assert client.get_vm_price("Standard_E2s_v3", "eastus") is None
+            assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.1
+            assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.1
+            assert fetch.call_count == 2
+
+            client.clear_cache()
+            assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.2
+            assert fetch.call_count == 3
+
+
+def test_price_lookups_accept_keyword_arguments():
+    """Ensure memoized getters take keyword arguments and share positional keys."""
+    with AzurePricingClient() as client:
+        vm = client.get_vm_price(size="Standard_D2s_v3", region="eastus")
+        storage = client.get_storage_price(account_type="Standard_LRS", region="eastus")
+        disk = client.get_managed_disk_price("Premium_LRS", size_gb=100, region="eastus")
+
+        assert vm["retailPrice"] == 0.096
+        assert storage["retailPrice"] == 0.0184
+        assert disk is not None
+
+        assert client.get_vm_price("Standard_D2s_v3", "eastus") is vm
+        assert client.get_storage_price("Standard_LRS", "eastus") is storage
+        assert client.get_managed_disk_price("Premium_LRS", 100, "eastus") is disk
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_prices_are_prefetched_in_one_batch(mock_get, tmp_path):
+    """Ensure API prices for several VMs in a region come from one request."""
+    plan_data = {
+        "resource_changes": [
+            {
+                "address": f"azurerm_linux_virtual_machine.{size}",
+                "type": "azurerm_linux_virtual_machine",
+                "name": size,
+                "change": {
+                    "actions": ["create"],
+                    "after": {"location": "eastus", "size": size}
+                }
+            }
+            for size in ("Standard_E2s_v3", "Standard_E4s_v3")
+        ]
+    }
+
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_text(json.dumps(plan_data))
+
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "Items": [
+            {"skuName": "E2s v3", "retailPrice": 0.1, "serviceName": "Virtual Machines"},
+            {"skuName": "Standard_E2s_v3", "retailPrice": 0.1, "serviceName": "Virtual Machines"},
+            {"skuName": "Standard_E4s_v3", "retailPrice": 0.2, "serviceName": "Virtual Machines"},
+        ],
+        "NextPageLink": None
+    }
+    mock_get.return_value = mock_response
+
+    calculator = CostCalculator(str(plan_file))
+    breakdown = calculator.calculate_costs()
+
+    assert mock_get.call_count == 1
+    query = mock_get.call_args.kwargs['params']['$filter']
+    assert "contains(skuName, 'Standard_E2s_v3')" in query
+    assert " or " in query
+    assert breakdown.total_monthly_cost == pytest.approx(0.3 * 730)
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_prices_persist_across_clients(mock_get):
+    """Ensure a fresh client reads prices cached on disk by a previous one."""
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.1}]
+    }
+    mock_get.return_value = mock_response
+
+    with AzurePricingClient() as client:
+        assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.1
+
+    with AzurePricingClient() as client:
+        assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.1
+
+    assert mock_get.call_count == 1
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_refresh_cache_ignores_prices_on_disk(mock_get):
+    """Ensure refresh_cache re-fetches prices and overwrites the stale entry."""
+    stale, fresh = Mock(), Mock()
+    stale.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.1}]
+    }
+    fresh.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.2}]
+    }
+    mock_get.side_effect = [stale, fresh]
+
+    with AzurePricingClient() as client:
+        client.get_vm_price("Standard_E2s_v3", "eastus")
+
+    with AzurePricingClient(refresh_cache=True) as client:
+        assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.2
+
+    with AzurePricingClient() as client:
+        assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.2
+
+    assert mock_get.call_count == 2
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_clear_cache_survives_a_locked_store(mock_get):
+    """Ensure a failure to clear the disk cache is logged, not raised."""
+    stale, fresh = Mock(), Mock()
+    stale.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.1}]
+    }
+    fresh.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.2}]
+    }
+    mock_get.side_effect = [stale, fresh]
+
+    with AzurePricingClient() as client:
+        client.get_vm_price("Standard_E2s_v3", "eastus")
+
+        with patch.object(client, '_store') as store:
+            store.execute.side_effect = sqlite3.OperationalError("database is locked")
+            client.clear_cache()
+
+        # Entries that couldn't be deleted are no longer read back
+        assert client.get_vm_price("Standard_E2s_v3", "eastus")["retailPrice"] == 0.2
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_price_cache_ignores_case_and_whitespace(mock_get):
+    """Ensure equivalent lookups with different spelling share a cache entry."""
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "Items": [{"skuName": "Standard_E2s_v3", "retailPrice": 0.1}]
+    }
+    mock_get.return_value = mock_response
+
+    with AzurePricingClient() as client:
+        client.get_vm_price("Standard_E2s_v3", "eastus")
+        client.get_vm_price(" standard_e2s_v3 ", "EastUS")
+
+    assert mock_get.call_count == 1
+
+
+def test_plan_parser_extracts_resource_changes_once(sample_plan_json):
+    """Ensure the parser accessors share one extracted resource list."""
+    parser = PlanParser(sample_plan_json)
+    with pytest.raises(ValueError):
+        parser.get_resource_changes()
+
+    with patch.object(
+        PlanParser,
+        '_extract_resource_config',
+        autospec=True,
+        side_effect=PlanParser._extract_resource_config
+    ) as mock_extract:
+        parser.load_plan()
+        assert parser.get_resource_count() == 2
+        assert sorted(parser.get_resource_types()) == [
+            "azurerm_linux_virtual_machine",
+            "azurerm_storage_account"
+        ]
+        assert parser.get_resource_changes() is parser.get_resource_changes()
+        assert mock_extract.call_count == 2
+
+
+def test_plan_parser_handles_utf8_bom(tmp_path):
+    """Ensure plans saved with a UTF-8 byte order mark are parsed."""
+    plan_data = {
+        "resource_changes": [
+            {
+                "address": "azurerm_resource_group.test",
+                "type": "azurerm_resource_group",
+                "name": "test",
+                "change": {"actions": ["create"], "after": {"location": "eastus"}}
+            }
+        ]
+    }
+
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_bytes(codecs.BOM_UTF8 + json.dumps(plan_data).encode('utf-8'))
+
+    parser = PlanParser(str(plan_file))
+    parser.load_plan()
+
+    assert parser.get_resource_count() == 1
+    assert parser.get_resource_changes()[0]["location"] == "eastus"
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_prefetch_stops_paging_for_unmatched_specs(mock_get):
+    """Ensure a batch gives up after a bounded number of result pages."""
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "Items": [
+            {"skuName": "Standard_E2s_v3", "retailPrice": 0.1, "serviceName": "Virtual Machines"}
+        ],
+        "NextPageLink": "https://prices.azure.com/api/retail/prices?$skip=100"
+    }
+    mock_get.return_value = mock_response
+
+    with AzurePricingClient() as client:
+        client.prefetch([
+            client.vm_price_spec("Standard_E2s_v3", "eastus"),
+            client.vm_price_spec("Standard_Missing", "eastus"),
+        ])
+        assert mock_get.call_count == AzurePricingClient.PREFETCH_MAX_PAGES
+
+        # Specs the batch didn't reach still get a single lookup
+        client.get_vm_price("Standard_Missing", "eastus")
+        assert mock_get.call_count == AzurePricingClient.PREFETCH_MAX_PAGES + 1
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_prices_missing_from_a_complete_batch_are_not_queried_again(mock_get):
+    """Ensure a price absent from a fully paged batch isn't looked up singly."""
+    mock_response = Mock()
+    mock_response.json.return_value = {"Items": []}
+    mock_get.return_value = mock_response
+
+    with AzurePricingClient() as client:
+        client.prefetch([client.vm_price_spec("Standard_Nope", "eastus")])
+        assert client.get_vm_price("Standard_Nope", "eastus") is None
+        assert client.get_vm_price("Standard_Nope", "eastus") is None
+        assert mock_get.call_count == 1
+
+        client.clear_cache()
+        assert client.get_vm_price("Standard_Nope", "eastus") is None
+        assert mock_get.call_count == 2
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_vm_and_os_disk_prices_share_one_request(mock_get, tmp_path):
+    """Ensure a VM and its OS disk are priced by a single batched request."""
+    plan_data = {
+        "resource_changes": [
+            {
+                "address": "azurerm_linux_virtual_machine.test",
+                "type": "azurerm_linux_virtual_machine",
+                "name": "test",
+                "change": {
+                    "actions": ["create"],
+                    "after": {
+                        "location": "eastus",
+                        "size": "Standard_E2s_v3",
+                        "os_disk": [{"storage_account_type": "StandardSSD_LRS"}]
+                    }
+                }
+            }
+        ]
+    }
+
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_text(json.dumps(plan_data))
+
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "Items": [
+            {
+                "serviceName": "Virtual Machines",
+                "skuName": "Standard_E2s_v3",
+                "retailPrice": 0.1
+            },
+            {
+                "serviceName": "Managed Disks",
+                "skuName": "StandardSSD_LRS",
+                "productName": "Managed Disks P10",
+                "retailPrice": 9.6
+            }
+        ]
+    }
+    mock_get.return_value = mock_response
+
+    calculator = CostCalculator(str(plan_file))
+    breakdown = calculator.calculate_costs()
+    calculator.close()
+
+    assert mock_get.call_count == 1
+    assert breakdown.total_monthly_cost == pytest.approx(0.1 * 730 + 9.6)
+
+
+@patch('terrafin_calculator.azure_pricing.requests.Session.get')
+def test_location_display_names_are_canonicalized(mock_get, tmp_path):
+    """Ensure "East US" and "eastus" are priced as the same ARM region."""
+    plan_data = {
+        "resource_changes": [
+            {
+                "address": f"azurerm_linux_virtual_machine.{name}",
+                "type": "azurerm_linux_virtual_machine",
+                "name": name,
+                "change": {
+                    "actions": ["create"],
+                    "after": {"location": location, "size": "Standard_E2s_v3"}
+                }
+            }
+            for name, location in (("a", "East US"), ("b", "eastus"))
+        ]
+    }
+
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_text(json.dumps(plan_data))
+
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "Items": [
+            {
+                "serviceName": "Virtual Machines",
+                "skuName": "Standard_E2s_v3",
+                "retailPrice": 0.1
+            }
+        ]
+    }
+    mock_get.return_value = mock_response
+
+    calculator = CostCalculator(str(plan_file))
+    breakdown = calculator.calculate_costs()
+    calculator.close()
+
+    assert mock_get.call_count == 1
+    assert "armRegionName eq 'eastus'" in mock_get.call_args.kwargs['params']['$filter']
+    assert breakdown.total_monthly_cost == pytest.approx(2 * 0.1 * 730)